@@ -30,11 +30,14 @@
 
 import requests
 import json
+import os
 import time
 from pathlib import Path
 from typing import List, Dict, Optional, Set
 from datetime import datetime
 from PIL import Image, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ============================================================================
 # CONFIGURATION
@@ -42,6 +45,7 @@ from PIL import Image, ImageFilter
 
 MAX_NEW_ARTWORKS = 20
 RATE_LIMIT_DELAY = 2.0  # seconds between API calls
+IMAGE_CHUNK_SIZE = 1024 * 1024  # bytes per write when streaming images
 
 # Updated headers
 HEADERS = {
@@ -112,6 +116,18 @@ class ChicDownloader:
         self.failed_downloads = []
         self.successful_downloads = []
         self.newly_blacklisted = []
+        self.pending_new_ids: List[str] = []
+        self.pending_blacklist: List[str] = []
+        # SEARCH_PARAMS is static, so the Elasticsearch query is built once per run
+        self.search_query: Optional[Dict] = self.build_search_query()
+
+        # One pooled keep-alive session for API + IIIF calls; retries transient errors
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
         METADATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         IMAGES_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -141,6 +157,19 @@ class ChicDownloader:
             return set()
 
     def add_to_blacklist(self, object_id: int, reason: str = ""):
+        """Blacklist an ID in memory; written out once by flush_blacklist()"""
+        id_str = str(object_id)
+        if id_str in self.blacklist_ids:
+            return False
+        self.blacklist_ids.add(id_str)
+        self.pending_blacklist.append(id_str)
+        self.newly_blacklisted.append({'objectID': object_id, 'reason': reason})
+        return True
+
+    def flush_blacklist(self) -> bool:
+        """Merge queued IDs into the dontfetch file, sorting once, with an atomic replace"""
+        if not self.pending_blacklist:
+            return True
         try:
             if DONTFETCH_FILE.exists():
                 with open(DONTFETCH_FILE, 'r', encoding='utf-8') as f:
@@ -151,30 +180,24 @@ class ChicDownloader:
             else:
                 current = []
 
-            id_str = str(object_id)
-            if id_str not in current:
-                current.append(id_str)
-                try:
-                    current_sorted = sorted(current, key=lambda x: int(x))
-                except Exception:
-                    current_sorted = sorted(current)
-                with open(DONTFETCH_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(current_sorted, f, indent=2)
-                self.newly_blacklisted.append({'objectID': object_id, 'reason': reason})
-                return True
-            return False
+            merged = {str(i) for i in current}
+            merged.update(self.pending_blacklist)
+            try:
+                current_sorted = sorted(merged, key=lambda x: int(x))
+            except Exception:
+                current_sorted = sorted(merged)
+            tmp_path = DONTFETCH_FILE.with_name(DONTFETCH_FILE.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(current_sorted, indent=2))
+            os.replace(tmp_path, DONTFETCH_FILE)
+            self.pending_blacklist.clear()
+            return True
         except Exception:
             return False
 
     # ---------- Search / compare ----------
-    def build_search_params(self, page: int = 1) -> Dict:
-        """Construct parameters for the ARTIC search endpoint with Elasticsearch filtering"""
-        params = {
-            "limit": SEARCH_PAGE_LIMIT,
-            "page": page,
-            "fields": "id",
-        }
-        
+    def build_search_query(self) -> Optional[Dict]:
+        """Build the Elasticsearch filter query from SEARCH_PARAMS (None if no filters)"""
         query_filters = []
         
         if SEARCH_PARAMS.get('isPublicDomain') is not None:
@@ -207,19 +230,30 @@ class ChicDownloader:
                     query_filters.append({query_type: {"classification_titles": query_value}})
         
         if query_filters:
-            params['query'] = {"bool": {"must": query_filters}}
-        
+            return {"bool": {"must": query_filters}}
+        return None
+
+    def build_search_params(self, page: int = 1) -> Dict:
+        """Construct parameters for the ARTIC search endpoint with Elasticsearch filtering"""
+        params = {
+            "limit": SEARCH_PAGE_LIMIT,
+            "page": page,
+            "fields": "id",
+        }
+        if self.search_query:
+            params['query'] = self.search_query
         return params
 
     def fetch_available_artworks(self) -> List[int]:
-        all_ids: List[int] = []
+        # Insertion-ordered dict doubles as an ordered set: dedups across pages
+        all_ids: Dict[int, None] = {}
         page = 1
         pages_fetched = 0
 
         try:
             while True:
                 params = self.build_search_params(page=page)
-                resp = requests.post(SEARCH_ENDPOINT, json=params, headers=HEADERS, timeout=30)
+                resp = self.session.post(SEARCH_ENDPOINT, json=params, timeout=30)
 
                 if resp.status_code == 502:
                     print("\n❌ ARTIC API is currently unavailable (502).")
@@ -230,7 +264,7 @@ class ChicDownloader:
 
                 hits = payload.get('data', [])
                 ids_this_page = [int(item['id']) for item in hits if 'id' in item]
-                all_ids.extend(ids_this_page)
+                all_ids.update(dict.fromkeys(ids_this_page))
                 pages_fetched += 1
 
                 if len(all_ids) >= MAX_SEARCH_RESULTS_CAP:
@@ -252,7 +286,7 @@ class ChicDownloader:
                 page += 1
                 time.sleep(RATE_LIMIT_DELAY)
 
-            return list(dict.fromkeys(all_ids))
+            return list(all_ids)
 
         except requests.exceptions.RequestException as e:
             print(f"\n❌ Network error: {e}")
@@ -264,8 +298,8 @@ class ChicDownloader:
         api_ids_str = {str(i) for i in api_ids}
         already_have = api_ids_str & existing_ids
         blacklisted = api_ids_str & self.blacklist_ids
-        new_ids_str = api_ids_str - existing_ids - self.blacklist_ids
-        new_ids = sorted([int(i) for i in new_ids_str])
+        new_ids_str = api_ids_str.difference(existing_ids, self.blacklist_ids)
+        new_ids = sorted(map(int, new_ids_str))
 
         print("\n" + "="*70)
         print("COMPARISON RESULTS (ARTIC)")
@@ -281,7 +315,7 @@ class ChicDownloader:
         if new_ids:
             new_ids_list = new_ids[:50]
             print(f"\nNew artwork IDs (first {min(50, len(new_ids))}):")
-            print(new_ids_list)
+            print(", ".join(map(str, new_ids_list)))
             if len(new_ids) > 50:
                 print(f"... and {len(new_ids) - 50} more")
 
@@ -303,8 +337,7 @@ class ChicDownloader:
             ]
             url = f"{ARTWORK_ENDPOINT}/{object_id}"
             
-            # Appended HEADERS here
-            resp = requests.get(url, params={"fields": ",".join(fields)}, headers=HEADERS, timeout=20)
+            resp = self.session.get(url, params={"fields": ",".join(fields)}, timeout=20)
             resp.raise_for_status()
             payload = resp.json()
 
@@ -315,6 +348,11 @@ class ChicDownloader:
                 self.add_to_blacklist(object_id, "No image_id (search filter mismatch)")
                 return {}
 
+            # Verify public domain on the record itself before any image bytes are fetched
+            if not data.get('is_public_domain'):
+                self.add_to_blacklist(object_id, "Not public domain")
+                return {}
+
             return data
 
         except requests.exceptions.HTTPError as e:
@@ -335,16 +373,13 @@ class ChicDownloader:
         if not image_url:
             return None
         try:
-            # Appended HEADERS here
-            resp = requests.get(image_url, headers=HEADERS, timeout=40, stream=True)
+            resp = self.session.get(image_url, timeout=40, stream=True)
             resp.raise_for_status()
             ext = '.jpg'
             filename = f"{object_id}{ext}"
             filepath = IMAGES_OUTPUT_DIR / filename
             with open(filepath, 'wb') as f:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    if not chunk:
-                        continue
+                for chunk in resp.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
                     f.write(chunk)
             
             with Image.open(filepath) as img:
@@ -364,10 +399,9 @@ class ChicDownloader:
     def clean_artist_name(self, artist_display: str) -> str:
         if not artist_display:
             return ''
-        name = artist_display.split('\n')[0]
-        if '(' in name:
-            name = name.split('(')[0]
-        return name.strip()
+        # partition() stops at the first separator instead of building a full list
+        name = artist_display.partition('\n')[0]
+        return name.partition('(')[0].strip()
 
     def format_metadata(self, artwork_data: Dict, local_image_filename: str, iiif_base_url: str) -> Dict:
         raw_artist = artwork_data.get('artist_display', artwork_data.get('artist_title', ''))
@@ -395,12 +429,20 @@ class ChicDownloader:
         try:
             filepath = METADATA_OUTPUT_DIR / f"{object_id}.json"
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+                f.write(json.dumps(metadata, indent=2, ensure_ascii=False))
             return True
         except Exception:
             return False
 
     def append_to_artworkids(self, object_id: int) -> bool:
+        """Queue a new ID; written out once by flush_artworkids()"""
+        self.pending_new_ids.append(str(object_id))
+        return True
+
+    def flush_artworkids(self) -> bool:
+        """Append queued IDs to the IDs file with a single atomic replace"""
+        if not self.pending_new_ids:
+            return True
         try:
             if TEMP_NEWIDS_FILE.exists():
                 with open(TEMP_NEWIDS_FILE, 'r', encoding='utf-8') as f:
@@ -411,9 +453,13 @@ class ChicDownloader:
             else:
                 ids = []
 
-            ids.append(str(object_id))
-            with open(TEMP_NEWIDS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(ids, f, indent=2)
+            present = set(ids)
+            ids.extend(i for i in self.pending_new_ids if i not in present)
+            tmp_path = TEMP_NEWIDS_FILE.with_name(TEMP_NEWIDS_FILE.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(ids, indent=2))
+            os.replace(tmp_path, TEMP_NEWIDS_FILE)
+            self.pending_new_ids.clear()
             return True
         except Exception:
             return False
@@ -502,10 +548,16 @@ class ChicDownloader:
         to_download = new_ids[:MAX_NEW_ARTWORKS]
         print(f"\nStarting download of {len(to_download)} artworks...\n")
 
-        for idx, object_id in enumerate(to_download, 1):
-            print(f"[{idx}/{len(to_download)}] Processing artwork {object_id}...")
-            self.process_artwork(object_id)
-            time.sleep(RATE_LIMIT_DELAY)
+        try:
+            for idx, object_id in enumerate(to_download, 1):
+                print(f"[{idx}/{len(to_download)}] Processing artwork {object_id}...")
+                self.process_artwork(object_id)
+                time.sleep(RATE_LIMIT_DELAY)
+        finally:
+            if not self.flush_artworkids():
+                print(f"❌ Failed to write {len(self.pending_new_ids)} new ID(s) to {TEMP_NEWIDS_FILE.name}")
+            if not self.flush_blacklist():
+                print(f"❌ Failed to write {len(self.pending_blacklist)} blacklisted ID(s) to {DONTFETCH_FILE.name}")
 
         self.print_summary(start_time)
 
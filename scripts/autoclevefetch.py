@@ -29,11 +29,14 @@
 # =============================================================================
 import requests
 import json
+import os
 import time
 from pathlib import Path
 from typing import List, Dict, Optional, Set
 from datetime import datetime
 from PIL import Image, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ============================================================================
 # CONFIGURATION
@@ -41,6 +44,7 @@ from PIL import Image, ImageFilter
 
 MAX_NEW_ARTWORKS = 20
 RATE_LIMIT_DELAY = 1.0  # seconds between API calls
+IMAGE_CHUNK_SIZE = 1024 * 1024  # bytes per write when streaming images
 
 # Search parameters
 SEARCH_PARAMS = {
@@ -98,6 +102,15 @@ class CleveDownloader:
         self.failed_downloads = []
         self.successful_downloads = []
         self.newly_blacklisted = []
+        self.pending_new_ids: List[str] = []
+        self.pending_blacklist: List[str] = []
+
+        # One pooled keep-alive session for API + image calls; retries transient errors
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
         METADATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         IMAGES_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -131,6 +144,21 @@ class CleveDownloader:
             return set()
 
     def add_to_blacklist(self, accession_number: str, reason: str = "") -> bool:
+        """Blacklist an ID in memory; written out once by flush_blacklist()."""
+        if accession_number in self.blacklist_ids:
+            return False
+        self.blacklist_ids.add(accession_number)
+        self.pending_blacklist.append(accession_number)
+        self.newly_blacklisted.append({
+            'objectID': accession_number,
+            'reason': reason
+        })
+        return True
+
+    def flush_blacklist(self) -> bool:
+        """Merge queued IDs into clevedontfetch.json, sorting once, with an atomic replace."""
+        if not self.pending_blacklist:
+            return True
         try:
             if DONTFETCH_FILE.exists():
                 with open(DONTFETCH_FILE, "r") as f:
@@ -138,19 +166,15 @@ class CleveDownloader:
             else:
                 current = []
 
-            if accession_number not in current:
-                current.append(accession_number)
-                current.sort()
-                with open(DONTFETCH_FILE, "w") as f:
-                    json.dump(current, f, indent=2)
-                self.blacklist_ids.add(accession_number)
-                self.newly_blacklisted.append({
-                    'objectID': accession_number,
-                    'reason': reason
-                })
-                return True
-            return False
-        except Exception:
+            merged = sorted(set(current).union(self.pending_blacklist))
+            tmp_path = DONTFETCH_FILE.with_name(DONTFETCH_FILE.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps(merged, indent=2))
+            os.replace(tmp_path, DONTFETCH_FILE)
+            self.pending_blacklist.clear()
+            return True
+        except Exception as e:
+            print(f"  ❌ Failed to update {DONTFETCH_FILE.name}: {e}")
             return False
 
     # ---------- Search / compare ----------
@@ -173,7 +197,7 @@ class CleveDownloader:
                 # Append flag params as bare keys (no value)
                 url = f"{SEARCH_ENDPOINT}?cc0&currently_on_view"
 
-                response = requests.get(url, params=params, timeout=30)
+                response = self.session.get(url, params=params, timeout=30)
                 response.raise_for_status()
                 data = response.json()
 
@@ -212,7 +236,7 @@ class CleveDownloader:
         api_accessions = {item['accession_number'] for item in api_items}
         already_have = api_accessions & existing_ids
         blacklisted = api_accessions & self.blacklist_ids
-        new_accessions = api_accessions - existing_ids - self.blacklist_ids
+        new_accessions = api_accessions.difference(existing_ids, self.blacklist_ids)
 
         # Rebuild list preserving original order, filtered to new only
         new_items = [i for i in api_items if i['accession_number'] in new_accessions]
@@ -231,7 +255,7 @@ class CleveDownloader:
         if new_items:
             sample = [i['accession_number'] for i in new_items[:50]]
             print(f"\nNew accession numbers (first {min(50, len(new_items))}):")
-            print(sample)
+            print(", ".join(sample))
             if len(new_items) > 50:
                 print(f"  ... and {len(new_items) - 50} more")
 
@@ -244,7 +268,7 @@ class CleveDownloader:
         """Fetch full metadata for a single artwork by its numeric Athena id."""
         try:
             url = f"{ARTWORK_ENDPOINT}/{artwork_id}"
-            resp = requests.get(url, timeout=20)
+            resp = self.session.get(url, timeout=20)
             resp.raise_for_status()
             payload = resp.json()
             return payload.get('data')
@@ -260,7 +284,7 @@ class CleveDownloader:
         if not image_url:
             return None
         try:
-            resp = requests.get(image_url, timeout=30, stream=True)
+            resp = self.session.get(image_url, timeout=30, stream=True)
             resp.raise_for_status()
             # Infer extension from Content-Type, default to jpg
             content_type = resp.headers.get('Content-Type', 'image/jpeg')
@@ -268,7 +292,7 @@ class CleveDownloader:
             filename = f"{accession_number}.{ext}"
             filepath = IMAGES_OUTPUT_DIR / filename
             with open(filepath, 'wb') as f:
-                for chunk in resp.iter_content(chunk_size=8192):
+                for chunk in resp.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
                     f.write(chunk)
             
             with Image.open(filepath) as img:
@@ -297,7 +321,7 @@ class CleveDownloader:
         desc = creators[0].get('description', '')
         if not desc:
             return ''
-        name = desc.split('(')[0].strip()
+        name = desc.partition('(')[0].strip()
         return name
 
     def format_metadata(self, artwork_data: Dict, local_image_filename: str) -> Dict:
@@ -326,13 +350,22 @@ class CleveDownloader:
         try:
             filepath = METADATA_OUTPUT_DIR / f"{accession_number}.json"
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+                f.write(json.dumps(metadata, indent=2, ensure_ascii=False))
             return True
         except Exception as e:
             print(f"  ❌ Failed to save metadata for {accession_number}: {e}")
             return False
 
     def append_to_artworkids(self, accession_number: str) -> bool:
+        """Queue an accession number; written out once by flush_artworkids()."""
+        if accession_number not in self.pending_new_ids:
+            self.pending_new_ids.append(accession_number)
+        return True
+
+    def flush_artworkids(self) -> bool:
+        """Append queued IDs to artworkids.json with a single atomic replace."""
+        if not self.pending_new_ids:
+            return True
         try:
             if ARTWORKIDS_FILE.exists():
                 with open(ARTWORKIDS_FILE, "r") as f:
@@ -340,13 +373,16 @@ class CleveDownloader:
             else:
                 ids = []
 
-            if accession_number not in ids:
-                ids.append(accession_number)
-                with open(ARTWORKIDS_FILE, "w") as f:
-                    json.dump(ids, f, indent=2)
+            present = set(ids)
+            ids.extend(i for i in self.pending_new_ids if i not in present)
+            tmp_path = ARTWORKIDS_FILE.with_name(ARTWORKIDS_FILE.name + ".tmp")
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps(ids, indent=2))
+            os.replace(tmp_path, ARTWORKIDS_FILE)
+            self.pending_new_ids.clear()
             return True
         except Exception as e:
-            print(f"  ❌ Failed to update artworkids.json for {accession_number}: {e}")
+            print(f"  ❌ Failed to update artworkids.json: {e}")
             return False
 
     # ---------- Process single artwork ----------
@@ -441,10 +477,14 @@ class CleveDownloader:
         to_download = new_items[:MAX_NEW_ARTWORKS]
         print(f"Starting download of {len(to_download)} artworks...\n")
 
-        for idx, item in enumerate(to_download, 1):
-            acc = item['accession_number']
-            print(f"[{idx}/{len(to_download)}] Processing {acc}...")
-            self.process_artwork(item)
+        try:
+            for idx, item in enumerate(to_download, 1):
+                acc = item['accession_number']
+                print(f"[{idx}/{len(to_download)}] Processing {acc}...")
+                self.process_artwork(item)
+        finally:
+            self.flush_artworkids()
+            self.flush_blacklist()
 
         self.print_summary(start_time)
 
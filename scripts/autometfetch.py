@@ -31,11 +31,14 @@
 # =============================================================================
 import requests
 import json
+import os
 import time
 from pathlib import Path
 from typing import List, Dict, Optional, Set
 from datetime import datetime
 from PIL import Image, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ============================================================================
 # CONFIGURATION - Modify these settings as needed
@@ -47,6 +50,9 @@ MAX_NEW_ARTWORKS = 20
 # Rate limiting (seconds between API calls)
 RATE_LIMIT_DELAY = 1.0
 
+# Bytes per write when streaming images to disk
+IMAGE_CHUNK_SIZE = 1024 * 1024
+
 # API Search Parameters - Set to None to ignore, or provide value to filter
 # For auto script - looking for all public domain, highlight paintings with images
 SEARCH_PARAMS = {
@@ -121,6 +127,16 @@ class MetDownloader:
         self.failed_downloads = []
         self.successful_downloads = []
         self.newly_blacklisted = []  # Track IDs added to blacklist this session
+        self.pending_new_ids: List[str] = []  # New IDs, written once by flush_artworkids()
+        self.pending_blacklist: List[str] = []  # New blacklist IDs, written once by flush_blacklist()
+        
+        # Reuse one keep-alive session for every request (saves a TCP+TLS
+        # handshake per call) and retry transient server errors with backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
         # Create output directories if they don't exist
         METADATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -156,7 +172,21 @@ class MetDownloader:
             return set()
     
     def add_to_blacklist(self, object_id: int, reason: str = ""):
-        """Add an ID to the blacklist file"""
+        """Add an ID to the in-memory blacklist (persisted by flush_blacklist)"""
+        id_str = str(object_id)
+        if id_str in self.blacklist_ids:
+            return False
+        
+        self.blacklist_ids.add(id_str)
+        self.pending_blacklist.append(id_str)
+        self.newly_blacklisted.append({'objectID': object_id, 'reason': reason})
+        return True
+    
+    def flush_blacklist(self) -> bool:
+        """Merge queued IDs into metdontfetch.json, sorting once, with an atomic replace"""
+        if not self.pending_blacklist:
+            return True
+        
         try:
             # Load current blacklist
             if DONTFETCH_FILE.exists():
@@ -165,20 +195,18 @@ class MetDownloader:
             else:
                 blacklist = []
             
-            # Add new ID if not already there
-            id_str = str(object_id)
-            if id_str not in blacklist:
-                blacklist.append(id_str)
-                blacklist.sort(key=int)  # Keep sorted numerically
-                
-                # Save back
-                with open(DONTFETCH_FILE, 'w') as f:
-                    json.dump(blacklist, f, indent=2)
-                
-                self.newly_blacklisted.append({'objectID': object_id, 'reason': reason})
-                return True
+            merged = {str(id_val) for id_val in blacklist}
+            merged.update(self.pending_blacklist)
+            blacklist = sorted(merged, key=int)  # Keep sorted numerically
             
-            return False
+            # Save back
+            tmp_path = DONTFETCH_FILE.with_name(DONTFETCH_FILE.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(blacklist, indent=2))
+            os.replace(tmp_path, DONTFETCH_FILE)
+            
+            self.pending_blacklist.clear()
+            return True
             
         except Exception as e:
             return False
@@ -203,7 +231,7 @@ class MetDownloader:
         """Fetch list of artwork IDs from Met API based on search parameters"""
         try:
             url = self.build_search_url()
-            response = requests.get(url, timeout=30)
+            response = self.session.get(url, timeout=30)
             
             # Check for 502 Bad Gateway or other server errors
             if response.status_code == 502:
@@ -241,10 +269,10 @@ class MetDownloader:
         blacklisted = api_ids_str & self.blacklist_ids
         
         # Find new IDs: those in API results but NOT in existing collection AND NOT blacklisted
-        new_ids_str = api_ids_str - existing_ids - self.blacklist_ids
+        new_ids_str = api_ids_str.difference(existing_ids, self.blacklist_ids)
         
         # Convert back to integers for API calls (API IDs are always numeric)
-        new_ids = sorted([int(id_val) for id_val in new_ids_str])
+        new_ids = sorted(map(int, new_ids_str))
         
         print("\n" + "="*70)
         print("COMPARISON RESULTS")
@@ -260,7 +288,7 @@ class MetDownloader:
         if new_ids:
             new_ids_list = new_ids[:50]  # Show first 50
             print(f"\nNew artwork IDs (showing first {min(50, len(new_ids))}):")
-            print(new_ids_list)
+            print(", ".join(map(str, new_ids_list)))
             if len(new_ids) > 50:
                 print(f"... and {len(new_ids) - 50} more")
         
@@ -272,7 +300,7 @@ class MetDownloader:
         """Fetch full metadata for a single artwork"""
         try:
             url = f"{self.base_object_url}/{object_id}"
-            response = requests.get(url, timeout=15)
+            response = self.session.get(url, timeout=15)
             response.raise_for_status() # Raises HTTPError for 4xx/5xx responses
             data = response.json()
             
@@ -303,7 +331,7 @@ class MetDownloader:
             return None
         
         try:
-            response = requests.get(image_url, timeout=30, stream=True)
+            response = self.session.get(image_url, timeout=30, stream=True)
             response.raise_for_status()
             
             # Determine file extension
@@ -317,7 +345,7 @@ class MetDownloader:
             filepath = IMAGES_OUTPUT_DIR / filename
             
             with open(filepath, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+                for chunk in response.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
                     f.write(chunk)
             
             with Image.open(filepath) as img:
@@ -360,7 +388,7 @@ class MetDownloader:
         try:
             filepath = METADATA_OUTPUT_DIR / f"{object_id}.json"
             with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+                f.write(json.dumps(metadata, indent=2, ensure_ascii=False))
             
             return True
             
@@ -368,7 +396,15 @@ class MetDownloader:
             return False
     
     def append_to_artworkids(self, object_id: int) -> bool:
-        """Append new object ID to artworkids.json"""
+        """Queue new object ID for artworkids.json (see flush_artworkids)"""
+        self.pending_new_ids.append(str(object_id))
+        return True
+    
+    def flush_artworkids(self) -> bool:
+        """Append queued IDs to artworkids.json with a single atomic replace"""
+        if not self.pending_new_ids:
+            return True
+        
         try:
             if ARTWORKIDS_FILE.exists():
                 with open(ARTWORKIDS_FILE, 'r') as f:
@@ -376,11 +412,17 @@ class MetDownloader:
             else:
                 ids = []
             
-            ids.append(str(object_id))
+            present = set(ids)
+            ids.extend(i for i in self.pending_new_ids if i not in present)
             
-            with open(ARTWORKIDS_FILE, 'w') as f:
-                json.dump(ids, f, indent=2)
+            # Write to a temp file alongside, then swap it in so a crash never
+            # leaves a truncated artworkids.json behind
+            tmp_path = ARTWORKIDS_FILE.with_name(ARTWORKIDS_FILE.name + '.tmp')
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(ids, indent=2))
+            os.replace(tmp_path, ARTWORKIDS_FILE)
             
+            self.pending_new_ids.clear()
             return True
             
         except Exception as e:
@@ -460,10 +502,17 @@ class MetDownloader:
         
         print(f"\nStarting download of {len(artworks_to_download)} artworks...\n")
         
-        for idx, object_id in enumerate(artworks_to_download, 1):
-            print(f"[{idx}/{len(artworks_to_download)}] Processing artwork {object_id}...")
-            self.process_artwork(object_id)
-            time.sleep(RATE_LIMIT_DELAY)  # Rate limiting between artworks
+        try:
+            for idx, object_id in enumerate(artworks_to_download, 1):
+                print(f"[{idx}/{len(artworks_to_download)}] Processing artwork {object_id}...")
+                self.process_artwork(object_id)
+                time.sleep(RATE_LIMIT_DELAY)  # Rate limiting between artworks
+        finally:
+            # Persist new IDs once, even if the loop was interrupted
+            if not self.flush_artworkids():
+                print(f"❌ Failed to write {len(self.pending_new_ids)} new ID(s) to artworkids.json")
+            if not self.flush_blacklist():
+                print(f"❌ Failed to write {len(self.pending_blacklist)} blacklisted ID(s) to metdontfetch.json")
         
         # Final summary
         self.print_summary(start_time)
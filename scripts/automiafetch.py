@@ -34,6 +34,7 @@
 #   Paths  anchored to repo root via Path(__file__).parent.parent so the
 #          script can be run from any working directory.
 # =============================================================================
+import os
 import time
 import requests
 import json
@@ -42,6 +43,8 @@ from pathlib import Path
 from typing import List, Dict, Optional, Set
 from datetime import datetime
 from PIL import Image, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ============================================================================
 # CONFIGURATION
@@ -49,6 +52,7 @@ from PIL import Image, ImageFilter
 
 MAX_NEW_ARTWORKS = 20
 RATE_LIMIT_DELAY = 1.0  # seconds between image downloads
+IMAGE_CHUNK_SIZE = 1024 * 1024  # bytes per write when streaming images
 
 # Elasticsearch query string — all filters baked in
 SEARCH_QUERY = (
@@ -105,6 +109,15 @@ class MIADownloader:
         self.failed_downloads: List[Dict] = []
         self.successful_downloads: List[Dict] = []
         self.newly_blacklisted: List[Dict] = []
+        self.pending_new_ids: List[str] = []
+        self.pending_blacklist: List[str] = []
+
+        # One pooled keep-alive session for search + CDN calls; retries transient errors
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
         METADATA_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         IMAGES_OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -136,22 +149,32 @@ class MIADownloader:
             return set()
 
     def add_to_blacklist(self, mia_id: str, reason: str = "") -> bool:
+        """Blacklist an ID in memory; written out once by flush_blacklist()."""
+        if mia_id in self.blacklist_ids:
+            return True
+        self.blacklist_ids.add(mia_id)
+        self.pending_blacklist.append(mia_id)
+        self.newly_blacklisted.append({"objectID": mia_id, "reason": reason})
+        return True
+
+    def flush_blacklist(self) -> bool:
+        """Merge queued IDs into miadontfetch.json, sorting once, with an atomic replace."""
+        if not self.pending_blacklist:
+            return True
         try:
-            if mia_id in self.blacklist_ids:
-                return True
-            self.blacklist_ids.add(mia_id)
             existing = []
             if DONTFETCH_FILE.exists():
                 with open(DONTFETCH_FILE, "r", encoding="utf-8") as f:
                     existing = json.load(f)
-            if mia_id not in existing:
-                existing.append(mia_id)
-                existing.sort()
-                with open(DONTFETCH_FILE, "w", encoding="utf-8") as f:
-                    json.dump(existing, f, indent=2)
-            self.newly_blacklisted.append({"objectID": mia_id, "reason": reason})
+            merged = sorted(set(existing).union(self.pending_blacklist))
+            tmp_path = DONTFETCH_FILE.with_name(DONTFETCH_FILE.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(merged, indent=2))
+            os.replace(tmp_path, DONTFETCH_FILE)
+            self.pending_blacklist.clear()
             return True
-        except Exception:
+        except Exception as e:
+            print(f"    Failed to update {DONTFETCH_FILE.name}: {e}")
             return False
 
     # ---------- Search / compare ----------
@@ -168,7 +191,7 @@ class MIADownloader:
                 url = f"{SEARCH_BASE}/{encoded_query}"
                 params = {"size": SEARCH_PAGE_SIZE, "from": offset}
 
-                resp = requests.get(url, params=params, timeout=30)
+                resp = self.session.get(url, params=params, timeout=30)
                 resp.raise_for_status()
                 data = resp.json()
 
@@ -213,7 +236,7 @@ class MIADownloader:
         api_mia_ids = {f"mia-{item['id']}" for item in api_items if item.get("id") is not None}
         already_have = api_mia_ids & existing_ids
         blacklisted = api_mia_ids & self.blacklist_ids
-        new_mia_ids = api_mia_ids - existing_ids - self.blacklist_ids
+        new_mia_ids = api_mia_ids.difference(existing_ids, self.blacklist_ids)
 
         # Preserve original order, filtered to new only
         new_items = [
@@ -269,7 +292,7 @@ class MIADownloader:
             print(f"    ⚠ Blacklisting {mia_id}: missing Cache_Location or Primary_RenditionNumber.")
             return None
         try:
-            resp = requests.get(image_url, timeout=30, stream=True)
+            resp = self.session.get(image_url, timeout=30, stream=True)
             if resp.status_code == 403:
                 self.add_to_blacklist(mia_id, f"CDN returned 403 Forbidden")
                 print(f"    ⚠ Blacklisting {mia_id}: CDN returned 403 Forbidden.")
@@ -278,7 +301,7 @@ class MIADownloader:
             filename = f"{mia_id}.jpg"
             filepath = IMAGES_OUTPUT_DIR / filename
             with open(filepath, "wb") as f:
-                for chunk in resp.iter_content(chunk_size=8192):
+                for chunk in resp.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
                     f.write(chunk)
             
             with Image.open(filepath) as img:
@@ -319,25 +342,37 @@ class MIADownloader:
     def save_metadata(self, metadata: Dict, mia_id: str) -> bool:
         try:
             with open(METADATA_OUTPUT_DIR / f"{mia_id}.json", "w", encoding="utf-8") as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+                f.write(json.dumps(metadata, indent=2, ensure_ascii=False))
             return True
         except Exception as e:
             print(f"    Failed to save metadata for {mia_id}: {e}")
             return False
 
     def append_to_artworkids(self, mia_id: str) -> bool:
+        """Queue a new ID; written out once by flush_artworkids()."""
+        if mia_id not in self.pending_new_ids:
+            self.pending_new_ids.append(mia_id)
+        return True
+
+    def flush_artworkids(self) -> bool:
+        """Append queued IDs to artworkids.json with a single atomic replace."""
+        if not self.pending_new_ids:
+            return True
         try:
             existing = []
             if ARTWORKIDS_FILE.exists():
                 with open(ARTWORKIDS_FILE, "r", encoding="utf-8") as f:
                     existing = json.load(f)
-            if mia_id not in existing:
-                existing.append(mia_id)
-                with open(ARTWORKIDS_FILE, "w", encoding="utf-8") as f:
-                    json.dump(existing, f, indent=2)
+            present = set(existing)
+            existing.extend(i for i in self.pending_new_ids if i not in present)
+            tmp_path = ARTWORKIDS_FILE.with_name(ARTWORKIDS_FILE.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(existing, indent=2))
+            os.replace(tmp_path, ARTWORKIDS_FILE)
+            self.pending_new_ids.clear()
             return True
         except Exception as e:
-            print(f"    Failed to update artworkids.json for {mia_id}: {e}")
+            print(f"    Failed to update artworkids.json: {e}")
             return False
 
     # ---------- Process single artwork ----------
@@ -417,10 +452,14 @@ class MIADownloader:
         to_download = new_items[:MAX_NEW_ARTWORKS]
         print(f"Starting download of {len(to_download)} artworks...\n")
 
-        for idx, source in enumerate(to_download, 1):
-            mia_id = f"mia-{source.get('id')}"
-            print(f"[{idx}/{len(to_download)}] {mia_id}: {source.get('title', 'N/A')}")
-            self.process_artwork(source)
+        try:
+            for idx, source in enumerate(to_download, 1):
+                mia_id = f"mia-{source.get('id')}"
+                print(f"[{idx}/{len(to_download)}] {mia_id}: {source.get('title', 'N/A')}")
+                self.process_artwork(source)
+        finally:
+            self.flush_artworkids()
+            self.flush_blacklist()
 
         self.print_summary(start_time)
 
@@ -31,17 +31,24 @@
 # =============================================================================
 import requests
 import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 from PIL import Image, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 MAX_NEW_ARTWORKS = 20
-RATE_LIMIT_DELAY = 1.0  # Seconds between individual item requests
+RATE_LIMIT_DELAY = 1.0  # Minimum seconds between search/detail requests
+IMAGE_WORKERS = 6  # Parallel image downloads per batch (metadata stays serial)
+IMAGE_CHUNK_SIZE = 1024 * 1024  # bytes per write when streaming images
 
 # Paths (relative to repo root, not script location)
 _REPO_ROOT = Path(__file__).parent.parent
@@ -60,6 +67,33 @@ INITIAL_PARAMS = {
 }
 
 
+class RateLimiter:
+    """Spaces calls at least `interval` seconds apart, sleeping only for what's left."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_ok = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_ok - now
+            if delay > 0:
+                time.sleep(delay)
+            self.next_ok = max(now, self.next_ok) + self.interval
+
+
+def atomic_write_json(path: Path, data: Any) -> None:
+    """Write JSON to a sibling temp file, fsync once, then os.replace over path."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(data, indent=2))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
 def generate_thumbnail(src_path: Path, thumb_stem: str) -> None:
     """Generate a 50×50 WebP thumbnail matching the grid view display format."""
     try:
@@ -117,7 +151,7 @@ class LODMapper:
         return ""
 
     @staticmethod
-    def resolve_visual_data(shows: List[Dict]) -> Dict:
+    def resolve_visual_data(shows: List[Dict], session: requests.Session) -> Dict:
         """Walk shows → VisualItem → DigitalObject to get IIIF base URL and public domain status."""
         result = {"iiif_base": "", "is_pd": False}
         if not shows:
@@ -127,7 +161,7 @@ class LODMapper:
             visual_item_id = shows[0].get("id") if isinstance(shows[0], dict) else None
             if not visual_item_id:
                 return result
-            vi_resp = requests.get(visual_item_id, headers={"Accept": "application/json"}, timeout=20)
+            vi_resp = session.get(visual_item_id, headers={"Accept": "application/json"}, timeout=20)
             if vi_resp.status_code != 200:
                 return result
             vi_data = vi_resp.json()
@@ -151,7 +185,7 @@ class LODMapper:
             digital_obj_id = digital_shown_by[0].get("id") if isinstance(digital_shown_by[0], dict) else None
             if not digital_obj_id:
                 return result
-            do_resp = requests.get(digital_obj_id, headers={"Accept": "application/json"}, timeout=20)
+            do_resp = session.get(digital_obj_id, headers={"Accept": "application/json"}, timeout=20)
             if do_resp.status_code != 200:
                 return result
             do_data = do_resp.json()
@@ -161,7 +195,7 @@ class LODMapper:
             full_url = access_points[0].get("id", "")
             for suffix in ["/full/max/0/default.jpg", "/full/full/0/default.jpg", "/info.json"]:
                 if suffix in full_url:
-                    result["iiif_base"] = full_url.split(suffix)[0]
+                    result["iiif_base"] = full_url.partition(suffix)[0]
                     return result
             result["iiif_base"] = full_url
             return result
@@ -170,7 +204,7 @@ class LODMapper:
 
     @classmethod
     def map_to_old_schema(cls, data: Dict, uri: str, iiif_base: str = "", is_pd: bool = False) -> Dict:
-        obj_id = uri.split("/")[-1]
+        obj_id = uri.rpartition("/")[2]
 
         # Title: prefer English Name (language AAT 300388277), fall back to any Name
         en_title = ""
@@ -252,6 +286,19 @@ class RijksLODFetcher:
         self.failed_downloads = []
         self.successful_downloads = []
         self.newly_blacklisted = []
+        self.pending_new_ids = []
+        self.pending_blacklist = []
+        # Guards shared bookkeeping while image downloads run on worker threads
+        self._lock = threading.Lock()
+        # Time spent waiting on a response counts toward the delay instead of adding to it
+        self.limiter = RateLimiter(RATE_LIMIT_DELAY)
+        # One pooled keep-alive session for all Rijksmuseum hosts (search, id, iiif);
+        # retries transient gateway errors with exponential backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=10, max_retries=Retry(
+            total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504], raise_on_status=False))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
     def _load_ids(self) -> List[str]:
         if ARTWORKIDS_FILE.exists():
@@ -268,29 +315,38 @@ class RijksLODFetcher:
         return set()
 
     def _add_to_blacklist(self, obj_id: str, reason: str = ""):
-        if obj_id in self.blacklist:
-            return
-        self.blacklist.add(obj_id)
-        existing = []
-        if DONTFETCH_FILE.exists():
-            with open(DONTFETCH_FILE, "r") as f:
-                existing = json.load(f)
-        if obj_id not in existing:
-            existing.append(obj_id)
-            existing.sort()
-            with open(DONTFETCH_FILE, "w") as f:
-                json.dump(existing, f, indent=2)
-        self.newly_blacklisted.append({'objectID': obj_id, 'reason': reason})
+        """Blacklist an ID in memory; written out once by flush_blacklist()."""
+        with self._lock:
+            if obj_id in self.blacklist:
+                return
+            self.blacklist.add(obj_id)
+            self.pending_blacklist.append(obj_id)
+            self.newly_blacklisted.append({'objectID': obj_id, 'reason': reason})
+
+    def flush_blacklist(self) -> bool:
+        """Merge queued IDs into rijksdontfetch.json, sorting once, with an atomic replace."""
+        if not self.pending_blacklist:
+            return True
+        try:
+            existing = []
+            if DONTFETCH_FILE.exists():
+                with open(DONTFETCH_FILE, "r") as f:
+                    existing = json.load(f)
+            atomic_write_json(DONTFETCH_FILE, sorted(set(existing).union(self.pending_blacklist)))
+            self.pending_blacklist.clear()
+            return True
+        except Exception as e:
+            print(f"  ⚠ Failed to write {DONTFETCH_FILE.name}: {e}")
+            return False
 
     def download_image(self, image_url: str, obj_id: str) -> bool:
         try:
-            resp = requests.get(image_url, timeout=30, stream=True)
+            resp = self.session.get(image_url, timeout=30, stream=True)
             resp.raise_for_status()
             dest = IMAGES_OUTPUT_DIR / f"{obj_id}.jpg"
             with open(dest, "wb") as f:
-                for chunk in resp.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                for chunk in resp.iter_content(chunk_size=IMAGE_CHUNK_SIZE):
+                    f.write(chunk)
             
             with Image.open(dest) as img:
                 w, h = img.size
@@ -309,62 +365,86 @@ class RijksLODFetcher:
     def save_metadata(self, metadata: Dict, obj_id: str) -> bool:
         try:
             with open(METADATA_OUTPUT_DIR / f"{obj_id}.json", "w", encoding="utf-8") as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
+                f.write(json.dumps(metadata, indent=2, ensure_ascii=False))
             return True
         except Exception:
             return False
 
     def append_to_artworkids(self, obj_id: str) -> bool:
+        """Record a new ID in memory; written to disk once by flush_artworkids()."""
+        if obj_id in self.processed_set:
+            return True
+        self.master_list.append(obj_id)
+        self.processed_set.add(obj_id)
+        self.pending_new_ids.append(obj_id)
+        return True
+
+    def flush_artworkids(self) -> bool:
+        """Write the master ID list once, atomically (never half-written)."""
+        if not self.pending_new_ids:
+            return True
         try:
-            self.master_list.append(obj_id)
-            self.processed_set.add(obj_id)
-            with open(ARTWORKIDS_FILE, "w") as f:
-                json.dump(self.master_list, f, indent=2)
+            atomic_write_json(ARTWORKIDS_FILE, self.master_list)
+            self.pending_new_ids.clear()
             return True
-        except Exception:
+        except Exception as e:
+            print(f"  ⚠ Failed to write {ARTWORKIDS_FILE.name}: {e}")
             return False
 
-    def process_artwork(self, obj_id: str, uri: str) -> bool:
-        detail_resp = requests.get(uri, headers={"Accept": "application/json"}, timeout=20)
+    def fetch_artwork_metadata(self, obj_id: str, uri: str) -> Optional[Dict[str, Any]]:
+        """Metadata phase: resolve the object and its image. Runs serially under the rate limit."""
+        detail_resp = self.session.get(uri, headers={"Accept": "application/json"}, timeout=20)
         if detail_resp.status_code != 200:
             self.failed_downloads.append({'objectID': obj_id, 'reason': f'HTTP {detail_resp.status_code} fetching detail'})
-            return False
+            return None
 
         raw_meta = detail_resp.json()
-        visual_data = LODMapper.resolve_visual_data(raw_meta.get("shows", []))
+        visual_data = LODMapper.resolve_visual_data(raw_meta.get("shows", []), self.session)
         iiif_base = visual_data["iiif_base"]
         is_pd = visual_data["is_pd"]
 
         if not is_pd:
             self._add_to_blacklist(obj_id, "Not public domain")
-            return False
+            return None
 
         if not iiif_base:
             self._add_to_blacklist(obj_id, "No IIIF image URL")
-            return False
+            return None
 
-        mapped_meta = LODMapper.map_to_old_schema(raw_meta, uri, iiif_base, is_pd)
+        return LODMapper.map_to_old_schema(raw_meta, uri, iiif_base, is_pd)
 
+    def process_artwork(self, obj_id: str, mapped_meta: Dict[str, Any]) -> bool:
+        """Download phase: image, metadata file and ID bookkeeping. Safe to run on worker threads."""
         if not self.download_image(mapped_meta["primaryImage"], obj_id):
-            self.failed_downloads.append({'objectID': obj_id, 'reason': 'Image download failed'})
+            with self._lock:
+                self.failed_downloads.append({'objectID': obj_id, 'reason': 'Image download failed'})
             return False
 
         if not self.save_metadata(mapped_meta, obj_id):
-            self.failed_downloads.append({'objectID': obj_id, 'reason': 'Failed to save metadata'})
-            return False
-
-        if not self.append_to_artworkids(obj_id):
-            self.failed_downloads.append({'objectID': obj_id, 'reason': 'Failed to update artworkids.json'})
+            with self._lock:
+                self.failed_downloads.append({'objectID': obj_id, 'reason': 'Failed to save metadata'})
             return False
 
-        self.successful_downloads.append({
-            'objectID': obj_id,
-            'title': mapped_meta['title'],
-            'artist': mapped_meta['artistDisplayName']
-        })
-        self.downloaded_count += 1
+        with self._lock:
+            if not self.append_to_artworkids(obj_id):
+                self.failed_downloads.append({'objectID': obj_id, 'reason': 'Failed to update artworkids.json'})
+                return False
+
+            self.successful_downloads.append({
+                'objectID': obj_id,
+                'title': mapped_meta['title'],
+                'artist': mapped_meta['artistDisplayName']
+            })
+            self.downloaded_count += 1
         return True
 
+    def process_batch(self, tasks: List[tuple]) -> None:
+        """Run the download phase for a batch of (obj_id, mapped_meta) tasks in parallel."""
+        if not tasks:
+            return
+        with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as ex:
+            list(ex.map(lambda task: self.process_artwork(*task), tasks))
+
     def run(self):
         start_time = datetime.now()
 
@@ -377,54 +457,70 @@ class RijksLODFetcher:
 
         current_url = SEARCH_URL
 
-        while self.downloaded_count < MAX_NEW_ARTWORKS:
-            try:
-                # Use params only on the first request; 'next' URLs have them baked in
-                r = requests.get(
-                    current_url,
-                    params=INITIAL_PARAMS if current_url == SEARCH_URL else None,
-                    headers={"Accept": "application/json"},
-                    timeout=30
-                )
-
-                if r.status_code != 200:
-                    print(f"Search failed: {r.status_code} - {r.text}")
-                    break
-
-                search_data = r.json()
-                items = search_data.get("orderedItems", [])
-
-                if not items:
-                    print("Reached end of search results.")
-                    break
-
-                for item in items:
-                    if self.downloaded_count >= MAX_NEW_ARTWORKS:
+        try:
+            while self.downloaded_count < MAX_NEW_ARTWORKS:
+                try:
+                    # Use params only on the first request; 'next' URLs have them baked in
+                    self.limiter.wait()
+                    r = self.session.get(
+                        current_url,
+                        params=INITIAL_PARAMS if current_url == SEARCH_URL else None,
+                        headers={"Accept": "application/json"},
+                        timeout=30
+                    )
+
+                    if r.status_code != 200:
+                        print(f"Search failed: {r.status_code} - {r.text}")
                         break
 
-                    uri = item.get("id")
-                    if not uri:
-                        continue
-                    obj_id = uri.split("/")[-1]
+                    search_data = r.json()
+                    items = search_data.get("orderedItems", [])
 
-                    if obj_id in self.processed_set or obj_id in self.blacklist:
-                        continue
+                    if not items:
+                        print("Reached end of search results.")
+                        break
 
-                    print(f"[{self.downloaded_count + 1}/{MAX_NEW_ARTWORKS}] Processing {obj_id}...")
-                    self.process_artwork(obj_id, uri)
-                    time.sleep(RATE_LIMIT_DELAY)
+                    # Metadata is fetched serially under the rate limiter; queued image
+                    # downloads run in parallel once enough tasks cover the remaining quota
+                    tasks = []
+                    for item in items:
+                        if self.downloaded_count >= MAX_NEW_ARTWORKS:
+                            break
+
+                        uri = item.get("id")
+                        if not uri:
+                            continue
+                        obj_id = uri.rpartition("/")[2]
+
+                        if obj_id in self.processed_set or obj_id in self.blacklist:
+                            continue
+
+                        print(f"[{self.downloaded_count + len(tasks) + 1}/{MAX_NEW_ARTWORKS}] Processing {obj_id}...")
+                        self.limiter.wait()
+                        mapped_meta = self.fetch_artwork_metadata(obj_id, uri)
+                        if mapped_meta:
+                            tasks.append((obj_id, mapped_meta))
+
+                        if len(tasks) >= MAX_NEW_ARTWORKS - self.downloaded_count:
+                            self.process_batch(tasks)
+                            tasks = []
+
+                    self.process_batch(tasks)
+
+                    # Find the 'next' page link (the token bookmark)
+                    next_page = search_data.get("next")
+                    if next_page and self.downloaded_count < MAX_NEW_ARTWORKS:
+                        current_url = next_page.get("id", "") if isinstance(next_page, dict) else next_page
+                        print("Moving to next page...")
+                    else:
+                        break
 
-                # Find the 'next' page link (the token bookmark)
-                next_page = search_data.get("next")
-                if next_page and self.downloaded_count < MAX_NEW_ARTWORKS:
-                    current_url = next_page.get("id", "") if isinstance(next_page, dict) else next_page
-                    print("Moving to next page...")
-                else:
+                except Exception as e:
+                    print(f"Error during execution: {e}")
                     break
-
-            except Exception as e:
-                print(f"Error during execution: {e}")
-                break
+        finally:
+            self.flush_artworkids()
+            self.flush_blacklist()
 
         self.print_summary(start_time)
 
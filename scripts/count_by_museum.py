@@ -21,19 +21,35 @@ MUSEUMS = [
 # Rijksmuseum sometimes has no trailing period, so make it optional for that museum only
 PATTERN = re.compile(r"^(" + "|".join(re.escape(m) for m in MUSEUMS) + r")(?:\.|\s*$)")
 
+# Only creditLine is needed, so pull the raw string value out of the bytes
+# instead of building the whole metadata dict for every file
+CREDIT_LINE_RE = re.compile(rb'"creditLine"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def read_credit_line(path: Path) -> str:
+    raw = path.read_bytes()
+    m = CREDIT_LINE_RE.search(raw)
+    if m:
+        value = m.group(1)
+        if b"\\" in value:
+            return json.loads(b'"' + value + b'"')  # unescape \uXXXX etc.
+        return value.decode("utf-8")
+    # No plain string value (missing/null/odd layout): fall back to a full parse
+    return json.loads(raw).get("creditLine") or ""
+
+
 counts = defaultdict(int)
 unmatched = 0
 
 for path in METADATA_DIR.glob("*.json"):
     try:
-        data = json.loads(path.read_text())
-        credit = data.get("creditLine", "")
+        credit = read_credit_line(path)
         m = PATTERN.match(credit)
         if m:
             counts[m.group(1)] += 1
         else:
             unmatched += 1
-    except (json.JSONDecodeError, OSError):
+    except (ValueError, OSError):
         unmatched += 1
 
 ranked = sorted(counts.items(), key=lambda x: x[1], reverse=True)
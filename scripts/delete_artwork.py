@@ -17,6 +17,15 @@ DONTFETCH_FILES = {
     "Rijksmuseum": os.path.join(BASE, "scripts", "rijksdontfetch.json"),
 }
 
+
+def write_json_atomic(path, data):
+    """Write to a sibling .tmp file, then os.replace so the target is never half-written."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(json.dumps(data, indent=2))
+    os.replace(tmp_path, path)
+
+
 object_id = input("Enter objectID to delete: ").strip()
 if not object_id:
     print("No objectID entered. Exiting.")
@@ -65,8 +74,7 @@ with open(ARTWORKIDS_FILE) as f:
 
 if object_id in artwork_ids:
     artwork_ids.remove(object_id)
-    with open(ARTWORKIDS_FILE, "w") as f:
-        json.dump(artwork_ids, f, indent=2)
+    write_json_atomic(ARTWORKIDS_FILE, artwork_ids)
     print(f"Removed {object_id!r} from artworkids.json")
 else:
     print(f"{object_id!r} not found in artworkids.json (skipping)")
@@ -81,8 +89,7 @@ else:
 
     if object_id not in dontfetch:
         dontfetch.append(object_id)
-        with open(dontfetch_path, "w") as f:
-            json.dump(dontfetch, f, indent=2)
+        write_json_atomic(dontfetch_path, dontfetch)
         print(f"Added {object_id!r} to {os.path.basename(dontfetch_path)}")
     else:
         print(f"{object_id!r} already in {os.path.basename(dontfetch_path)}")
@@ -28,11 +28,29 @@ missing_fields = []
 errored_files = []
 
 # For reverse-checks
-all_image_files = []
 used_image_files = []
 
 required_fields = ['objectID', 'title', 'localImage', 'isPublicDomain', 'objectURL']
 
+# ------------------------------------------------
+# Index metadata/images once (one scandir per folder instead of a stat per file)
+# ------------------------------------------------
+metadata_dir = os.path.join(PUBLIC_DIR, 'metadata')
+images_dir = os.path.join(PUBLIC_DIR, 'images')
+
+with os.scandir(metadata_dir) as entries:
+    all_metadata_files = [
+        e.name for e in entries
+        if e.name.endswith(".json") and e.is_file()
+    ]
+with os.scandir(images_dir) as entries:
+    all_image_files = [
+        e.name for e in entries
+        if not e.name.startswith('.') and e.is_file()  # ignore .DS_Store etc.
+    ]
+metadata_names = set(all_metadata_files)
+image_names = set(all_image_files)
+
 # ------------------------------------------------
 # Validation loop
 # ------------------------------------------------
@@ -42,9 +60,9 @@ for i, obj_id in enumerate(object_ids):
         print(f"  Checked {i + 1}/{len(object_ids)}...")
 
     errored_in_this_loop = False
-    json_path = os.path.join(PUBLIC_DIR, 'metadata', f'{obj_id}.json')
+    json_path = os.path.join(metadata_dir, f'{obj_id}.json')
 
-    if not os.path.exists(json_path):
+    if f'{obj_id}.json' not in metadata_names:
         missing_json.append(obj_id)
         errored_files.append(json_path)
         continue
@@ -64,10 +82,10 @@ for i, obj_id in enumerate(object_ids):
         # Check image file exists
         if 'localImage' in data and data['localImage']:
             image_filename = data['localImage']
-            image_path = os.path.join(PUBLIC_DIR, 'images', image_filename)
+            image_path = os.path.join(images_dir, image_filename)
             used_image_files.append(image_path)
 
-            if not os.path.exists(image_path):
+            if image_filename not in image_names:
                 missing_images.append({'objectID': obj_id, 'filename': image_filename})
                 errored_files.append(image_path)
 
@@ -85,24 +103,13 @@ for i, obj_id in enumerate(object_ids):
 # ------------------------------------------------
 print("\n🔄 Checking for extra files not listed in artworkids.json...")
 
-metadata_dir = os.path.join(PUBLIC_DIR, 'metadata')
-images_dir = os.path.join(PUBLIC_DIR, 'images')
-
-all_metadata_files = [
-    f for f in os.listdir(metadata_dir)
-    if f.endswith(".json")
-]
-all_image_files = [
-    f for f in os.listdir(images_dir)
-    if not f.startswith('.')  # ignore .DS_Store etc.
-]
-
+object_id_set = set(object_ids)
 extra_metadata = [
     f for f in all_metadata_files
-    if f.replace(".json", "") not in object_ids
+    if f.replace(".json", "") not in object_id_set
 ]
 
-used_image_names = [os.path.basename(p) for p in used_image_files]
+used_image_names = {os.path.basename(p) for p in used_image_files}
 extra_images = [
     f for f in all_image_files
     if f not in used_image_names
@@ -177,7 +184,7 @@ if extra_metadata or extra_images:
             src = os.path.join(metadata_dir, f)
             dest = os.path.join(trash_metadata_dir, f)
             try:
-                os.rename(src, dest)
+                os.replace(src, dest)
                 moved_metadata += 1
             except Exception as e:
                 print(f"   ⚠️ Failed to move {f}: {e}")
@@ -187,7 +194,7 @@ if extra_metadata or extra_images:
             src = os.path.join(images_dir, f)
             dest = os.path.join(trash_images_dir, f)
             try:
-                os.rename(src, dest)
+                os.replace(src, dest)
                 moved_images += 1
             except Exception as e:
                 print(f"   ⚠️ Failed to move {f}: {e}")